@@ -1,23 +1,62 @@
+import functools
+import hashlib
 import os
+import threading
+import time
 from datetime import datetime, timedelta, timezone
-from jose import jwt, JWTError
-from passlib.context import CryptContext
+import bcrypt
+import jwt
+from jwt import InvalidTokenError
 
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
 JWT_ALG = "HS256"
 JWT_EXPIRE_HOURS = 24
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib의 CryptContext를 거치지 않고 bcrypt C 바인딩을 직접 호출.
+# verify마다 돌던 스킴 해석/ident 파싱 같은 순수 파이썬 오버헤드가 빠진다.
+# 라운드는 명시적으로 고정: 라이브러리 기본값이 조용히 12로 올라가면
+# 해시 한 번에 4배 느려진다 (2^cost). 필요하면 env로만 조정.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))
 
 def hash_passcode(passcode: str) -> str:
-    return pwd_context.hash(passcode)
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return bcrypt.hashpw(passcode.encode("utf-8"), salt).decode("ascii")
+
+# bcrypt 검증 결과 캐시.
+# 같은 브라우저가 같은 passcode로 연타하는 패턴에서 요청마다 수십 ms짜리
+# bcrypt를 다시 돌리지 않게 한다. 키에 저장된 해시가 같이 들어가므로
+# 비번 교체(해시 변경) 시 자동으로 미스가 난다.
+# 핸들러들이 스레드풀에서 동시에 부르니까 조회/청소/삽입은 락으로 감싼다.
+# (bcrypt 본체는 락 밖에서 돈다 — 수십 ms짜리를 직렬화하면 캐시 의미가 없음)
+_VERIFY_CACHE_TTL = 60.0
+_VERIFY_CACHE_MAX = 512
+_verify_cache: dict[tuple[bytes, str], tuple[float, bool]] = {}
+_verify_cache_lock = threading.Lock()
 
 def verify_passcode(passcode: str, hashed: str) -> bool:
+    key = (hashlib.sha256(passcode.encode("utf-8")).digest(), hashed)
+    now = time.monotonic()
+
+    with _verify_cache_lock:
+        hit = _verify_cache.get(key)
+    if hit is not None and hit[0] > now:
+        return hit[1]
+
     try:
-        return pwd_context.verify(passcode, hashed)
-    except Exception:
+        ok = bcrypt.checkpw(passcode.encode("utf-8"), hashed.encode("utf-8"))
+    except (ValueError, TypeError):
         return False
 
+    with _verify_cache_lock:
+        if len(_verify_cache) >= _VERIFY_CACHE_MAX:
+            # 만료분만 걷어내고, 그래도 꽉 차 있으면 통째로 비움 (단순하게 간다)
+            for k in [k for k, (exp, _) in list(_verify_cache.items()) if exp <= now]:
+                _verify_cache.pop(k, None)
+            if len(_verify_cache) >= _VERIFY_CACHE_MAX:
+                _verify_cache.clear()
+        _verify_cache[key] = (now + _VERIFY_CACHE_TTL, ok)
+    return ok
+
 def create_token(user_id: str) -> str:
     now = datetime.now(timezone.utc)
     payload = {
@@ -27,12 +66,19 @@ def create_token(user_id: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
 
+# 같은 브라우저는 모든 요청에 같은 토큰을 들고 오니까 서명 검증은 토큰당 한 번만.
+# 캐시에는 exp를 같이 넣어두고 히트 때마다 만료만 다시 본다.
+# (실패한 디코드는 lru_cache에 안 남으므로 나쁜 토큰이 캐시를 오염시키지 않음)
+@functools.lru_cache(maxsize=2048)
+def _decode_verified(token: str) -> tuple[str, int]:
+    payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+    user_id = payload.get("sub")
+    if not user_id:
+        raise InvalidTokenError("No subject")
+    return user_id, int(payload["exp"])
+
 def decode_token(token: str) -> str:
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise JWTError("No subject")
-        return user_id
-    except JWTError as e:
-        raise e
+    user_id, exp = _decode_verified(token)
+    if exp <= int(time.time()):
+        raise jwt.ExpiredSignatureError("Token expired")
+    return user_id
@@ -1,124 +1,197 @@
 import os
-import json
-from datetime import datetime, date
-from typing import Optional, List, Dict, Any
-
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Annotated, Optional, List, Dict
+
+from fastapi import FastAPI, Depends, Header, HTTPException
+from fastapi.responses import FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, StringConstraints
+from dotenv import load_dotenv
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+# 로컬 개발용 .env 로드. auth/db가 import 시점에 env를 읽으니 그 전에 해야 함.
+# (이미 설정된 변수는 안 덮으니 Render의 진짜 env가 항상 우선)
+load_dotenv()
+
+from .auth import create_token, decode_token, verify_passcode
+from .db import Base, SessionLocal, engine, get_db
+from .models import Event, User
+from .seed import seed_users
 
 # -----------------------------
-# 환경변수
+# Pydantic 모델
 # -----------------------------
-# Render에서 Environment Variables로 넣은 값들
-PASS_HJ = os.getenv("PASS_HJ", "").strip()
-PASS_KS = os.getenv("PASS_KS", "").strip()
-PASS_JH = os.getenv("PASS_JH", "").strip()
+# strip은 핸들러에서 일일이 하지 말고 pydantic-core(러스트)가 파싱하면서 하게 둔다
+NonBlankStr = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+StrippedStr = Annotated[str, StringConstraints(strip_whitespace=True)]
 
-# 기본 사용자 목록(고정 3명)
-USERS = [
-    {"id": "HJ", "name": "HJ", "pass_env": "PASS_HJ", "password": PASS_HJ},
-    {"id": "KS", "name": "KS", "pass_env": "PASS_KS", "password": PASS_KS},
-    {"id": "JH", "name": "JH", "pass_env": "PASS_JH", "password": PASS_JH},
-]
 
-# 간단 DB: JSON 파일로 저장 (Render에서도 디스크는 일단 동작, 다만 free 플랜은 재배포/재시작 시 날아갈 수 있음)
-# 제대로 영구 저장하려면 Postgres 붙여야 하는데, 너 지금 급한 건 "작동"이잖아.
-DATA_PATH = os.getenv("DATA_PATH", "data.json")
+class LoginBody(BaseModel):
+    user_id: NonBlankStr
+    passcode: str
 
 
-def load_data() -> Dict[str, Any]:
-    if not os.path.exists(DATA_PATH):
-        return {"events": []}
-    try:
-        with open(DATA_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"events": []}
+class EventCreate(BaseModel):
+    title: NonBlankStr
+    start_at: datetime
+    end_at: datetime
+    all_day: bool = False
+    note: Optional[StrippedStr] = None
+    passcode: str
 
 
-def save_data(data: Dict[str, Any]) -> None:
-    with open(DATA_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+class EventUpdate(BaseModel):
+    title: StrippedStr
+    note: Optional[StrippedStr] = None
+    passcode: str
 
 
 # -----------------------------
-# Pydantic 모델
+# 사용자 캐시
 # -----------------------------
-class LoginBody(BaseModel):
-    user_id: str
-    password: str
+# 사용자는 시드된 3명에서 변하지 않으니 시작할 때 한 번만 떠서 메모리로 서빙.
+# 요청마다 users 테이블 SELECT 안 날림.
+_users_by_id: Dict[str, Dict[str, str]] = {}
+PUBLIC_USERS: List[Dict[str, str]] = []
+
+
+def _load_users(db: Session) -> None:
+    _users_by_id.clear()
+    for u in db.execute(select(User)).scalars():
+        _users_by_id[u.id] = {
+            "id": u.id,
+            "name": u.name,
+            "color": u.color,
+            "passcode_hash": u.passcode_hash,
+        }
+    PUBLIC_USERS[:] = [
+        {"id": u["id"], "name": u["name"], "color": u["color"]}
+        for u in _users_by_id.values()
+    ]
 
 
-class EventCreate(BaseModel):
-    user_id: str
-    password: str
-    title: str
-    day: str  # "YYYY-MM-DD"
-    time: Optional[str] = None  # "HH:MM" optional
-    memo: Optional[str] = ""
+# -----------------------------
+# 시작 시 DB 초기화
+# -----------------------------
+# gunicorn -w N 이면 워커마다 create_all 리플렉션 + 시드 트랜잭션이 돌아서
+# 시작이 O(워커 수)로 느려짐. 락을 잡은 한 놈만 무거운 초기화를 하고,
+# 나머지는 테이블 존재 확인만 하고 지나가게 한다.
+_INIT_LOCK_KEY = 715001  # pg advisory lock용 아무 숫자
+_INIT_LOCK_PATH = os.getenv("DB_INIT_LOCK", ".db-init.lock")
+
+
+def _init_db() -> None:
+    insp = inspect(engine)
+    if not (insp.has_table("users") and insp.has_table("events")):
+        Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        seed_users(db)  # 이미 시드됐으면 SELECT 한 방이면 끝
+        _load_users(db)
+    finally:
+        db.close()
+
+
+def _init_db_guarded() -> None:
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": _INIT_LOCK_KEY})
+            try:
+                _init_db()
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": _INIT_LOCK_KEY})
+        return
+
+    # SQLite: 같은 디스크를 쓰는 프로세스끼리 O_EXCL 락파일로 줄 세움
+    while True:
+        try:
+            fd = os.open(_INIT_LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(_INIT_LOCK_PATH) > 30:
+                    os.unlink(_INIT_LOCK_PATH)  # 죽은 프로세스가 남긴 락
+                    continue
+            except OSError:
+                pass
+            time.sleep(0.05)
+    try:
+        _init_db()
+    finally:
+        os.close(fd)
+        try:
+            os.unlink(_INIT_LOCK_PATH)
+        except OSError:
+            pass
 
 
-class EventUpdate(BaseModel):
-    user_id: str
-    password: str
-    title: Optional[str] = None
-    time: Optional[str] = None
-    memo: Optional[str] = None
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    _init_db_guarded()
+    yield
 
 
 # -----------------------------
 # FastAPI 앱
 # -----------------------------
-app = FastAPI(title="Cyber Calendar", version="1.0.0")
+# JSON 직렬화는 orjson으로 (stdlib json보다 3~5배 빠르고 date/datetime도 바로 처리)
+app = FastAPI(
+    title="Cyber Calendar",
+    version="1.0.0",
+    lifespan=_lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # 정적 파일(프론트) 마운트
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
-@app.get("/")
-def root():
-    # 루트에서 index.html 제공 (Render에서 빈 화면/404 뜨던 거 여기서 끝냄)
-    return FileResponse("static/index.html")
-
-
-@app.get("/health")
-def health():
-    return {"ok": True, "time": datetime.utcnow().isoformat()}
-
-
 # -----------------------------
 # 유틸: 인증
 # -----------------------------
-def require_login(user_id: str, password: str) -> Dict[str, str]:
-    user_id = (user_id or "").strip()
-    password = (password or "").strip()
+def current_user(authorization: Optional[str] = Header(default=None)) -> Dict[str, str]:
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Login required")
+    try:
+        user_id = decode_token(authorization[7:])
+    except Exception:
+        raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = next((u for u in USERS if u["id"] == user_id), None)
+    user = _users_by_id.get(user_id)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid user")
+    return user
+
 
-    if not user["password"]:
-        # 환경변수 자체가 비어있으면 서버가 인증 불가
-        raise HTTPException(
-            status_code=500,
-            detail=f"Server missing env var {user['pass_env']}. Set it on Render.",
-        )
+def check_passcode(user: Dict[str, str], passcode: str) -> None:
+    # 수정/삭제도 매번 암호 확인하는 게 이 앱의 룰
+    if not verify_passcode(passcode, user["passcode_hash"]):
+        raise HTTPException(status_code=401, detail="Wrong passcode")
 
-    if password != user["password"]:
-        raise HTTPException(status_code=401, detail="Wrong password")
 
-    return {"id": user["id"], "name": user["name"]}
+@app.get("/")
+async def root():
+    # 루트에서 index.html 제공 (Render에서 빈 화면/404 뜨던 거 여기서 끝냄)
+    return FileResponse("static/index.html")
+
+
+@app.get("/health")
+async def health():
+    return {"ok": True, "time": datetime.utcnow().isoformat()}
 
 
 # -----------------------------
 # API: 사용자 목록 (프론트가 /api/users 부르니까 반드시 있어야 함)
 # -----------------------------
 @app.get("/api/users")
-def api_users():
-    # 비번은 절대 내려주지 않음 (세상에…)
-    return [{"id": u["id"], "name": u["name"]} for u in USERS]
+async def api_users():
+    # 비번 해시는 절대 내려주지 않음 (세상에…)
+    return PUBLIC_USERS
 
 
 # -----------------------------
@@ -126,102 +199,129 @@ def api_users():
 # -----------------------------
 @app.post("/api/login")
 def api_login(body: LoginBody):
-    user = require_login(body.user_id, body.password)
-    return {"ok": True, "user": user}
+    # bcrypt가 수십 ms 걸리니 def로 둬서 스레드풀에서 돌림 (이벤트 루프 안 막게)
+    user = _users_by_id.get(body.user_id)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid user")
+    if not verify_passcode(body.passcode, user["passcode_hash"]):
+        raise HTTPException(status_code=401, detail="Wrong passcode")
+
+    return {
+        "ok": True,
+        "token": create_token(user["id"]),
+        "user_id": user["id"],
+        "name": user["name"],
+        "color": user["color"],
+    }
 
 
 # -----------------------------
 # API: 이벤트 CRUD
 # -----------------------------
 @app.get("/api/events")
-def api_list_events():
-    data = load_data()
-    events = data.get("events", [])
-    # 정렬(날짜/시간)
-    def key(e):
-        return (e.get("day", ""), e.get("time") or "99:99", e.get("id", ""))
-    events = sorted(events, key=key)
-    return {"events": events}
+def api_list_events(start: datetime, end: datetime, db: Session = Depends(get_db)):
+    # FullCalendar가 주는 [start, end) 범위와 겹치는 것만. 정렬은 DB에 맡김.
+    # ORM 엔티티 안 만들고 컬럼만 뽑는다 (행마다 identity map/인스턴스 생성 비용 제거).
+    # 소유자 이름/색은 메모리 캐시에 있으니 JOIN도 필요 없음.
+    rows = db.execute(
+        select(Event.id, Event.title, Event.start_at, Event.end_at,
+               Event.all_day, Event.owner_user_id, Event.note)
+        .where(Event.start_at < end, Event.end_at > start)
+        .order_by(Event.start_at, Event.id)
+    )
+
+    out = []
+    for eid, title, start_at, end_at, all_day, owner_id, note in rows:
+        owner = _users_by_id.get(owner_id)
+        out.append({
+            "id": eid,
+            "title": title,
+            "start": start_at.isoformat(),
+            "end": end_at.isoformat(),
+            "allDay": all_day,
+            "color": owner["color"] if owner else None,
+            "extendedProps": {
+                "ownerUserId": owner_id,
+                "ownerName": owner["name"] if owner else owner_id,
+                "note": note,
+            },
+        })
+    return out
 
 
 @app.post("/api/events")
-def api_create_event(body: EventCreate):
-    user = require_login(body.user_id, body.password)
-
-    # 날짜 검증
+def api_create_event(
+    body: EventCreate,
+    user: Dict[str, str] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    check_passcode(user, body.passcode)
+
+    if body.end_at <= body.start_at:
+        raise HTTPException(status_code=400, detail="end_at must be after start_at")
+
+    ev = Event(
+        id=str(uuid.uuid4()),
+        title=body.title,
+        start_at=body.start_at,
+        end_at=body.end_at,
+        all_day=body.all_day,
+        owner_user_id=user["id"],
+        note=body.note or None,
+    )
+    db.add(ev)
     try:
-        date.fromisoformat(body.day)
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid day (YYYY-MM-DD)")
-
-    if body.time:
-        # 아주 가벼운 시간 검증
-        try:
-            hh, mm = body.time.split(":")
-            int(hh), int(mm)
-        except Exception:
-            raise HTTPException(status_code=400, detail="Invalid time (HH:MM)")
-
-    data = load_data()
-    events = data.get("events", [])
-
-    new_id = f"e{int(datetime.utcnow().timestamp() * 1000)}"
-    ev = {
-        "id": new_id,
-        "owner": user["id"],
-        "title": body.title.strip(),
-        "day": body.day,
-        "time": (body.time or "").strip() or None,
-        "memo": (body.memo or "").strip(),
-        "created_at": datetime.utcnow().isoformat(),
-    }
-    events.append(ev)
-    data["events"] = events
-    save_data(data)
-    return {"ok": True, "event": ev}
-
-
-@app.patch("/api/events/{event_id}")
-def api_update_event(event_id: str, body: EventUpdate):
-    user = require_login(body.user_id, body.password)
-
-    data = load_data()
-    events = data.get("events", [])
-
-    ev = next((x for x in events if x.get("id") == event_id), None)
+        db.commit()
+    except IntegrityError:
+        # ck_events_valid_range 위반: 달력 범위 밖 날짜
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Date outside calendar range")
+    return {"ok": True, "id": ev.id}
+
+
+@app.put("/api/events/{event_id}")
+def api_update_event(
+    event_id: str,
+    body: EventUpdate,
+    user: Dict[str, str] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    check_passcode(user, body.passcode)
+
+    ev = db.get(Event, event_id)
     if not ev:
         raise HTTPException(status_code=404, detail="Event not found")
-
-    if ev.get("owner") != user["id"]:
+    if ev.owner_user_id != user["id"]:
         raise HTTPException(status_code=403, detail="Only owner can edit")
 
-    if body.title is not None:
-        ev["title"] = body.title.strip()
-    if body.time is not None:
-        t = body.time.strip()
-        ev["time"] = t if t else None
-    if body.memo is not None:
-        ev["memo"] = body.memo.strip()
-
-    ev["updated_at"] = datetime.utcnow().isoformat()
-    save_data(data)
-    return {"ok": True, "event": ev}
+    if body.title:  # 빈 제목으로 갈아엎는 건 무시 (기존 동작 유지)
+        ev.title = body.title
+    ev.note = body.note or None
+    db.commit()
+    return {"ok": True}
 
 
 @app.delete("/api/events/{event_id}")
-def api_delete_event(event_id: str, user_id: str, password: str):
-    user = require_login(user_id, password)
-
-    data = load_data()
-    events = data.get("events", [])
-
-    ev = next((x for x in events if x.get("id") == event_id), None)
+def api_delete_event(
+    event_id: str,
+    passcode: str,
+    user: Dict[str, str] = Depends(current_user),
+    db: Session = Depends(get_db),
+):
+    check_passcode(user, passcode)
+
+    ev = db.get(Event, event_id)
     if not ev:
         raise HTTPException(status_code=404, detail="Event not found")
-
-    if ev.get("owner") != user["id"]:
+    if ev.owner_user_id != user["id"]:
         raise HTTPException(status_code=403, detail="Only owner can delete")
 
-    data["events"] = [x for x in events if x.get("id") != event_id]
-    save_data(data)
+    db.delete(ev)
+    db.commit()
     return {"ok": True}
+
+if __name__ == "__main__":
+    # python -m backend.main 으로 바로 띄울 때용. 배포는 render.yaml의 uvicorn 커맨드 사용.
+    import uvicorn
+
+    uvicorn.run("backend.main:app", host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
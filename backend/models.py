@@ -1,4 +1,4 @@
-from sqlalchemy import String, DateTime, Boolean, ForeignKey, func
+from sqlalchemy import CheckConstraint, String, DateTime, Boolean, ForeignKey, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .db import Base
 
@@ -14,11 +14,22 @@ class User(Base):
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # 소유자별 기간 조회가 풀스캔 타지 않게 복합 인덱스
+        Index("ix_events_owner_start", "owner_user_id", "start_at"),
+        # 달력이 서빙하는 범위(프론트 validRange와 동일)를 DB가 거름.
+        # 핸들러에서 파이썬으로 또 검사하지 않는다.
+        CheckConstraint(
+            "start_at >= '2025-12-01' AND start_at < '2027-01-01'",
+            name="ck_events_valid_range",
+        ),
+    )
 
     id: Mapped[str] = mapped_column(String(36), primary_key=True)  # uuid str
     title: Mapped[str] = mapped_column(String(200), nullable=False)
 
-    start_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # index: /api/events의 기간 조회는 소유자 조건 없이 돌아서 복합 인덱스를 못 탐
+    start_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False, index=True)
     end_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), nullable=False)
     all_day: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
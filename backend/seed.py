@@ -1,4 +1,5 @@
 import os
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from .models import User
 from .auth import hash_passcode
@@ -11,9 +12,10 @@ USERS = [
 
 def seed_users(db: Session):
     # 이미 있으면 건드리지 않음(운영에서 갑자기 비번 바뀌면 난리남)
+    # 사용자별로 SELECT 날리지 말고 있는 id를 한 방에 가져온다.
+    existing_ids = set(db.execute(select(User.id)).scalars())
     for u in USERS:
-        existing = db.get(User, u["id"])
-        if existing:
+        if u["id"] in existing_ids:
             continue
 
         passcode = os.getenv(u["env"])